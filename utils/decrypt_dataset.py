@@ -14,8 +14,12 @@ Usage:
         --format csv
 
 Requirements:
+    Python 3.10+
     pip install cryptography base58
 
+    Optional (faster base58/base64 decoding and JSON parsing):
+    pip install based58 pybase64 orjson msgspec
+
 Note:
     This script uses deterministic key derivation (double SHA-256) instead of X25519 ECDH.
     Updated to match mobile app implementation that avoids HKDF SecretKey extraction issues.
@@ -23,13 +27,233 @@ Note:
 
 import argparse
 import base64
+import codecs
+import functools
 import json
+import logging
+import mmap
+import os
+import re
+import stat
 import sys
-from typing import Dict, Any
+import tempfile
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple, TypedDict, Union
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.asymmetric import x25519
 import hashlib
-import base58
+
+try:
+    # Rust extension, much faster than the pure-Python base58 package
+    from based58 import b58decode
+except ImportError:
+    from base58 import b58decode
+
+try:
+    # SIMD base64 decoder, used for the large envelope and ciphertext fields
+    from pybase64 import b64decode as fast_b64decode
+except ImportError:
+    # Accepts str and buffers (no copy), skips non-alphabet characters
+    from binascii import a2b_base64 as fast_b64decode
+
+try:
+    # Parses bytes directly and is several times faster than stdlib json
+    from orjson import loads as json_loads
+except ImportError:
+    def json_loads(data):
+        """stdlib json.loads, which doesn't take memoryviews."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+try:
+    # Decodes and validates the envelope against its schema in C
+    import msgspec
+except ImportError:
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+# Number of leading bytes detect_format() inspects
+FORMAT_SNIFF_SIZE = 4096
+
+
+class KeyWrap(TypedDict):
+    """Content key wrapped for one recipient."""
+    recipient_solana_pub58: str
+    eph_pub: str
+    wrapped_ck: str
+    wrap_nonce: str
+
+
+class Envelope(TypedDict):
+    """Encryption envelope as produced by the mobile app."""
+    algo: str
+    cipher_iv: str
+    cipher_tag: str
+    ciphertext: str
+    # Each wrap is only checked against KeyWrap once selected (see
+    # _decode_wrap), so a malformed wrap for another recipient is ignored
+    wraps: List[Dict[str, Any]]
+
+
+@dataclass(slots=True)
+class ParsedWrap:
+    """Key wrap with its base64 fields decoded."""
+    recipient_pub: str
+    eph_pub: bytes
+    wrapped_ck: bytes
+    wrap_nonce: bytes
+
+
+@dataclass(slots=True)
+class ParsedEnvelope:
+    """
+    Encryption envelope with its top-level base64 fields decoded.
+    
+    Wraps are kept as parsed and only decoded once selected (see
+    _decode_wrap), so other recipients' wraps cost nothing and can't fail
+    decryption.
+    """
+    ciphertext: bytes
+    iv: bytes
+    tag: bytes
+    wraps_by_recipient: Dict[str, Dict[str, Any]]
+
+
+def _decode_wrap(wrap: Dict[str, Any]) -> ParsedWrap:
+    """Validate a key wrap against KeyWrap and decode its base64 fields."""
+    for field in KeyWrap.__annotations__:
+        if not isinstance(wrap.get(field), str):
+            raise ValueError(f"Missing or invalid field: {field}")
+    
+    return ParsedWrap(
+        recipient_pub=wrap['recipient_solana_pub58'],
+        eph_pub=base64.b64decode(wrap['eph_pub']),
+        wrapped_ck=base64.b64decode(wrap['wrapped_ck']),
+        wrap_nonce=base64.b64decode(wrap['wrap_nonce']),
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _derive_x25519_from_ed25519(ed25519_pubkey: bytes) -> bytes:
+    """
+    Derive X25519 PUBLIC KEY from Ed25519 public key using SHA-256 seed.
+    
+    Cached per process so repeated decryptors for the same recipient skip
+    the X25519 scalar multiplication.
+    
+    This matches the mobile app's deterministic derivation approach:
+    1. SHA-256(Ed25519 public key) → seed
+    2. Generate X25519 keypair from seed
+    3. Extract X25519 PUBLIC KEY
+    
+    Args:
+        ed25519_pubkey: 32-byte Ed25519 public key
+        
+    Returns:
+        32-byte X25519 public key (derived deterministically)
+    """
+    if len(ed25519_pubkey) != 32:
+        raise ValueError(f"Ed25519 public key must be 32 bytes, got {len(ed25519_pubkey)}")
+    
+    # Step 1: Hash the Ed25519 public key to create seed
+    # This matches: crypto_hash.sha256.convert(ed25519PublicKey)
+    seed = hashlib.sha256(ed25519_pubkey).digest()
+    
+    # Step 2: Generate X25519 keypair from seed
+    # This matches: x25519Algorithm.newKeyPairFromSeed(x25519Seed)
+    # Step 3: Extract X25519 public key
+    # This matches: publicKey.bytes
+    # (cryptography has no API that skips the X25519PublicKey object, so the
+    # calls are just chained without keeping intermediates around)
+    return x25519.X25519PrivateKey.from_private_bytes(seed).public_key().public_bytes_raw()
+
+
+def _make_content_key_unwrapper(
+    recipient_pubkey: str,
+    recipient_x25519_pubkey: bytes,
+    kdf_info: bytes,
+    verbose: bool
+) -> Callable[[ParsedEnvelope], bytes]:
+    """
+    Build the content key unwrap for one recipient.
+    
+    Everything fixed per recipient is bound into the returned closure as
+    locals, which keeps per-envelope overhead down when a decryptor is
+    reused for many small datasets.
+    
+    The wrapping key uses the same algorithm as mobile app:
+    1. Get ephemeral secret from wrap
+    2. First SHA-256 hash of ephemeral secret + recipient X25519 key
+    3. Second SHA-256 hash with KDF info
+    
+    Args:
+        recipient_pubkey: Recipient's Solana public key (base58-encoded)
+        recipient_x25519_pubkey: Recipient's derived X25519 public key
+        kdf_info: KDF info string for this recipient
+        verbose: Log progress messages
+        
+    Returns:
+        Function mapping a parsed envelope to its decrypted content key
+    """
+    sha256 = hashlib.sha256
+    aesgcm = AESGCM
+    decode_wrap = _decode_wrap
+    log = logger.info
+    
+    def unwrap_content_key(envelope: ParsedEnvelope) -> bytes:
+        # Step 2: Find matching key wrap for this recipient
+        try:
+            raw_wrap = envelope.wraps_by_recipient[recipient_pubkey]
+        except KeyError:
+            raise ValueError(
+                f"No key wrap found for recipient {recipient_pubkey}. "
+                f"Available recipients: {[pub[:20] + '...' for pub in envelope.wraps_by_recipient]}"
+            ) from None
+        
+        try:
+            wrap = decode_wrap(raw_wrap)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"Invalid key wrap for recipient {recipient_pubkey}: {e}") from None
+        
+        if verbose:
+            log("🔑 Found key wrap for recipient")
+        
+        # Step 3: Derive wrapping key from the ephemeral secret (stored in eph_pub field)
+        ephemeral_secret = wrap.eph_pub
+        
+        if len(ephemeral_secret) != 32:
+            raise ValueError(f"Invalid ephemeral secret length: {len(ephemeral_secret)}")
+        
+        if verbose:
+            log("🔐 Deriving wrapping key using deterministic SHA-256...")
+        
+        # First SHA-256 hash over ephemeral secret + recipient X25519 public key
+        # (fed via update() so the concatenation is never built)
+        first = sha256(ephemeral_secret)
+        first.update(recipient_x25519_pubkey)
+        
+        # Second SHA-256 hash with KDF info
+        second = sha256(first.digest())
+        second.update(kdf_info)
+        wrapping_key = second.digest()
+        
+        if verbose:
+            log(f"✓ Wrapping key derived: {len(wrapping_key)} bytes")
+            log("🔓 Decrypting content key...")
+        
+        # Step 4: Decrypt wrapped content key using AES-256-GCM
+        content_key = aesgcm(wrapping_key).decrypt(wrap.wrap_nonce, wrap.wrapped_ck, None)
+        
+        if verbose:
+            log(f"✓ Content key decrypted: {len(content_key)} bytes")
+        return content_key
+    
+    return unwrap_content_key
 
 
 class DatasetDecryptor:
@@ -37,239 +261,430 @@ class DatasetDecryptor:
     
     KDF_INFO = b'zdatar:ck-wrap'
     
-    def __init__(self, recipient_pubkey: str, recipient_private_key: str):
+    # Locates the (large) base64 ciphertext value inside the envelope JSON
+    CIPHERTEXT_PATTERN = re.compile(rb'"ciphertext"\s*:\s*"([^"]*)"')
+    
+    # Dataset ciphertext is decrypted in chunks of this size
+    DECRYPT_CHUNK_SIZE = 1024 * 1024
+    
+    def __init__(self, recipient_pubkey: str, recipient_private_key: str, verbose: bool = True):
         """
         Initialize decryptor.
         
         Args:
             recipient_pubkey: Recipient's Solana public key (base58-encoded)
             recipient_private_key: Recipient's Solana private key (base58-encoded, 64 bytes)
+            verbose: Log progress messages (disable for batch decryption).
+                Fixed for the lifetime of the decryptor.
         """
         self.recipient_pubkey = recipient_pubkey
+        self._verbose = verbose
         
         # Decode Ed25519 public key from base58 (32 bytes)
         # This is the SAME public key the mobile app uses for encryption
-        self.ed25519_public_key = base58.b58decode(recipient_pubkey)
+        self.ed25519_public_key = b58decode(recipient_pubkey.encode('ascii'))
         
         if len(self.ed25519_public_key) != 32:
             raise ValueError(f"Invalid public key length: {len(self.ed25519_public_key)} (expected 32 bytes)")
         
         # Decode private key (we don't actually need it for this deterministic derivation)
         # But we validate it exists and is correct format
-        private_key_full = base58.b58decode(recipient_private_key)
+        private_key_full = b58decode(recipient_private_key.encode('ascii'))
         if len(private_key_full) != 64:
             raise ValueError(f"Invalid private key length: {len(private_key_full)} (expected 64 bytes)")
         
         # Derive recipient X25519 PUBLIC KEY using deterministic seed-based derivation
         # This matches the mobile app: SHA-256(Ed25519 pubkey) → seed → X25519 keypair → public key
         # CRITICAL: Uses the PUBLIC KEY from --recipient-pubkey, NOT from the private key file
-        self.recipient_x25519_pubkey = self._derive_x25519_from_ed25519(self.ed25519_public_key)
+        self.recipient_x25519_pubkey = _derive_x25519_from_ed25519(bytes(self.ed25519_public_key))
         
-        print("🔑 Initialized decryptor with X25519 public key derived from Ed25519 public key")
-        print(f"   Recipient: {self.recipient_pubkey[:20]}...")
+        # KDF info string is fixed per recipient (same as mobile app)
+        self._kdf_info_bytes = f"{self.KDF_INFO.decode('utf-8')}:{self.recipient_pubkey[:8]}".encode('utf-8')
+        
+        # Key unwrap specialized for this recipient
+        self._unwrap_content_key = _make_content_key_unwrapper(
+            self.recipient_pubkey,
+            self.recipient_x25519_pubkey,
+            self._kdf_info_bytes,
+            self._verbose,
+        )
+        
+        self._log("🔑 Initialized decryptor with X25519 public key derived from Ed25519 public key")
+        self._log(f"   Recipient: {self.recipient_pubkey[:20]}...")
+    
+    @property
+    def verbose(self) -> bool:
+        """Whether progress messages are logged (read-only)."""
+        return self._verbose
     
-    @staticmethod
-    def _derive_x25519_from_ed25519(ed25519_pubkey: bytes) -> bytes:
+    def _log(self, message: str) -> None:
+        """Log a progress message if verbose."""
+        if self._verbose:
+            logger.info(message)
+    
+    def decrypt_dataset(
+        self,
+        encrypted_data: Union[bytes, memoryview],
+        encrypted_aes_key_base64: Union[str, bytes, memoryview]
+    ) -> bytearray:
         """
-        Derive X25519 PUBLIC KEY from Ed25519 public key using SHA-256 seed.
-        
-        This matches the mobile app's deterministic derivation approach:
-        1. SHA-256(Ed25519 public key) → seed
-        2. Generate X25519 keypair from seed
-        3. Extract X25519 PUBLIC KEY
+        Decrypt dataset using encrypted AES key envelope.
         
         Args:
-            ed25519_pubkey: 32-byte Ed25519 public key
+            encrypted_data: Encrypted dataset bytes
+            encrypted_aes_key_base64: Base64-encoded encryption envelope
             
         Returns:
-            32-byte X25519 public key (derived deterministically)
+            Decrypted dataset (the buffer it was decrypted into, not a copy)
         """
-        if len(ed25519_pubkey) != 32:
-            raise ValueError(f"Ed25519 public key must be 32 bytes, got {len(ed25519_pubkey)}")
-        
-        # Step 1: Hash the Ed25519 public key to create seed
-        # This matches: crypto_hash.sha256.convert(ed25519PublicKey)
-        seed = hashlib.sha256(ed25519_pubkey).digest()
-        
-        # Step 2: Generate X25519 keypair from seed
-        # This matches: x25519Algorithm.newKeyPairFromSeed(x25519Seed)
-        x25519_private = x25519.X25519PrivateKey.from_private_bytes(seed)
+        self._log(f"🔓 Decrypting dataset for recipient: {self.recipient_pubkey[:20]}...")
         
-        # Step 3: Extract X25519 public key
-        # This matches: publicKey.bytes
-        x25519_public = x25519_private.public_key()
-        x25519_public_bytes = x25519_public.public_bytes_raw()
+        # Step 1: Decode base64 and parse encryption envelope
+        envelope = self._parse_envelope(encrypted_aes_key_base64)
         
-        return x25519_public_bytes
+        # Steps 2-5: Unwrap content key and decrypt dataset
+        decrypted_data = self._decrypt_envelope(envelope)
         
-    def decrypt_dataset(
+        self._log(f"✅ Successfully decrypted {len(decrypted_data)} bytes")
+        return decrypted_data
+    
+    def decrypt_dataset_to(
         self,
-        encrypted_data: bytes,
-        encrypted_aes_key_base64: str
-    ) -> bytes:
+        encrypted_data: Union[bytes, memoryview],
+        encrypted_aes_key_base64: Union[str, bytes, memoryview],
+        writer: Callable[[bytes], Any]
+    ) -> int:
         """
-        Decrypt dataset using encrypted AES key envelope.
+        Decrypt dataset, passing each decrypted chunk to writer as it is produced.
+        
+        Each chunk is its own bytes object, so writer may keep it. The auth
+        tag is only verified after the last chunk, so callers must discard
+        what was written if this raises.
         
         Args:
             encrypted_data: Encrypted dataset bytes
             encrypted_aes_key_base64: Base64-encoded encryption envelope
+            writer: Called with each decrypted chunk (e.g. a file's write method)
             
         Returns:
-            Decrypted dataset bytes
+            Number of decrypted bytes written
         """
-        print(f"🔓 Decrypting dataset for recipient: {self.recipient_pubkey[:20]}...")
+        self._log(f"🔓 Decrypting dataset for recipient: {self.recipient_pubkey[:20]}...")
         
         # Step 1: Decode base64 and parse encryption envelope
         envelope = self._parse_envelope(encrypted_aes_key_base64)
         
-        # Step 2: Find matching key wrap for this recipient
-        wrap = self._find_recipient_wrap(envelope)
+        # Steps 2-5: Unwrap content key and decrypt dataset into writer
+        decrypted_size = self._decrypt_envelope(envelope, writer)
+        
+        self._log(f"✅ Successfully decrypted {decrypted_size} bytes")
+        return decrypted_size
+    
+    def decrypt_many(
+        self,
+        envelopes_and_keys: Iterable[Tuple[Union[bytes, memoryview], Union[str, bytes, memoryview]]],
+        max_workers: Optional[int] = None
+    ) -> List[bytearray]:
+        """
+        Decrypt several datasets for this recipient in parallel.
         
-        # Step 3: Derive wrapping key using HKDF
-        wrapping_key = self._derive_wrapping_key(wrap)
+        All envelopes are parsed (and their base64 fields decoded) up front, so
+        the worker threads only run AES-GCM, which releases the GIL.
+        
+        Args:
+            envelopes_and_keys: (encrypted_data, encrypted_aes_key_base64) pairs,
+                as accepted by decrypt_dataset()
+            max_workers: Thread pool size (default: CPU count)
+            
+        Returns:
+            Decrypted datasets, in input order
+        """
+        envelopes = [
+            self._parse_envelope(encrypted_aes_key_base64)
+            for _, encrypted_aes_key_base64 in envelopes_and_keys
+        ]
         
-        # Step 4: Decrypt wrapped content key
-        content_key = self._decrypt_content_key(wrap, wrapping_key)
+        self._log(f"🔓 Decrypting {len(envelopes)} datasets for recipient: {self.recipient_pubkey[:20]}...")
         
-        # Step 5: Decrypt dataset with content key
-        decrypted_data = self._decrypt_data(envelope, content_key)
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            decrypted = list(executor.map(self._decrypt_envelope, envelopes))
         
-        print(f"✅ Successfully decrypted {len(decrypted_data)} bytes")
-        return decrypted_data
+        self._log(f"✅ Successfully decrypted {len(decrypted)} datasets")
+        return decrypted
     
-    def _parse_envelope(self, encrypted_aes_key_base64: str) -> Dict[str, Any]:
-        """Parse and validate encryption envelope."""
+    def _decrypt_envelope(
+        self,
+        envelope: ParsedEnvelope,
+        writer: Optional[Callable[[bytes], Any]] = None
+    ) -> Union[bytearray, int]:
+        """Decrypt the dataset in an already parsed envelope (see _decrypt_data)."""
+        # Steps 2-4: Find this recipient's key wrap and unwrap the content key
+        content_key = self._unwrap_content_key(envelope)
+        
+        # Step 5: Decrypt dataset with content key
+        return self._decrypt_data(envelope, content_key, writer)
+    
+    def _parse_envelope(self, encrypted_aes_key_base64: Union[str, bytes, memoryview]) -> ParsedEnvelope:
+        """Parse and validate encryption envelope, decoding its top-level base64 fields once."""
         try:
             # Decode base64
-            envelope_json_bytes = base64.b64decode(encrypted_aes_key_base64)
-            envelope_json_str = envelope_json_bytes.decode('utf-8')
+            envelope_json_bytes = fast_b64decode(encrypted_aes_key_base64)
             
-            # Parse JSON
-            envelope = json.loads(envelope_json_str)
+            # Decode the ciphertext straight from its span in the raw JSON and
+            # blank it out, so the JSON parser never copies it into a str.
+            # Only done when the raw span is the value itself: no JSON escapes
+            # in it, and no other "ciphertext" key after it.
+            ciphertext = None
+            match = self.CIPHERTEXT_PATTERN.search(envelope_json_bytes)
+            if match:
+                start, end = match.span(1)
+                if (envelope_json_bytes.find(b'\\', start, end) == -1
+                        and envelope_json_bytes.find(b'"ciphertext"', end) == -1):
+                    ciphertext = fast_b64decode(memoryview(envelope_json_bytes)[start:end])
+                    envelope_json_bytes = envelope_json_bytes[:start] + envelope_json_bytes[end:]
             
-            # Validate structure
-            required_fields = ['algo', 'cipher_iv', 'cipher_tag', 'ciphertext', 'wraps']
-            for field in required_fields:
-                if field not in envelope:
-                    raise ValueError(f"Missing required field: {field}")
+            if msgspec is not None:
+                # Parse JSON and validate structure in one pass
+                envelope = msgspec.json.decode(envelope_json_bytes, type=Envelope)
+            else:
+                # Parse JSON (both parsers take UTF-8 bytes directly)
+                envelope = json_loads(envelope_json_bytes)
+                
+                # Validate structure (same checks msgspec does for Envelope)
+                for field, field_type in Envelope.__annotations__.items():
+                    if field not in envelope:
+                        raise ValueError(f"Missing required field: {field}")
+                    if not isinstance(envelope[field], typing.get_origin(field_type) or field_type):
+                        raise ValueError(f"Invalid type for field: {field}")
+                if not all(isinstance(wrap, dict) for wrap in envelope['wraps']):
+                    raise ValueError("Invalid type for field: wraps")
             
             if envelope['algo'] != 'AES-256-GCM':
                 raise ValueError(f"Unsupported algorithm: {envelope['algo']}")
             
-            print(f"📦 Parsed envelope with {len(envelope['wraps'])} key wraps")
-            return envelope
+            # The pre-decoded bytes are only used if the blanked span really was
+            # the top-level field
+            if ciphertext is None or envelope['ciphertext'] != '':
+                ciphertext = fast_b64decode(envelope['ciphertext'])
+            
+            # Index wraps by recipient so lookup doesn't scan every wrap.
+            # The first wrap for a recipient wins, as with a linear scan.
+            wraps_by_recipient = {}
+            for wrap in envelope['wraps']:
+                recipient = wrap.get('recipient_solana_pub58')
+                if isinstance(recipient, str):
+                    wraps_by_recipient.setdefault(recipient, wrap)
+            
+            self._log(f"📦 Parsed envelope with {len(envelope['wraps'])} key wraps")
+            return ParsedEnvelope(
+                ciphertext=ciphertext,
+                iv=base64.b64decode(envelope['cipher_iv']),
+                tag=base64.b64decode(envelope['cipher_tag']),
+                wraps_by_recipient=wraps_by_recipient,
+            )
             
         except Exception as e:
             raise ValueError(f"Failed to parse encryption envelope: {e}")
     
-    def _find_recipient_wrap(self, envelope: Dict[str, Any]) -> Dict[str, Any]:
-        """Find key wrap for this recipient."""
-        for wrap in envelope['wraps']:
-            if wrap['recipient_solana_pub58'] == self.recipient_pubkey:
-                print("🔑 Found key wrap for recipient")
-                return wrap
-        
-        raise ValueError(
-            f"No key wrap found for recipient {self.recipient_pubkey}. "
-            f"Available recipients: {[w['recipient_solana_pub58'][:20] + '...' for w in envelope['wraps']]}"
-        )
-    
-    def _derive_wrapping_key(self, wrap: Dict[str, Any]) -> bytes:
+    def _decrypt_data(
+        self,
+        envelope: ParsedEnvelope,
+        content_key: bytes,
+        writer: Optional[Callable[[bytes], Any]] = None
+    ) -> Union[bytearray, int]:
         """
-        Derive wrapping key using deterministic double SHA-256 hashing.
+        Decrypt dataset using content key.
         
-        Uses the same algorithm as mobile app:
-        1. Get ephemeral secret from wrap
-        2. Combine ephemeral secret + recipient X25519 key
-        3. First SHA-256 hash
-        4. Second SHA-256 hash with KDF info
+        Without a writer the whole dataset is decrypted into one buffer, which
+        is returned. With a writer each chunk is decrypted into a reusable
+        chunk-sized buffer and passed to writer as a bytes copy (so writer may
+        keep it), and the byte count is returned.
         """
-        # Get ephemeral secret from wrap (stored in eph_pub field)
-        ephemeral_secret = base64.b64decode(wrap['eph_pub'])
-        
-        if len(ephemeral_secret) != 32:
-            raise ValueError(f"Invalid ephemeral secret length: {len(ephemeral_secret)}")
-        
-        print("🔐 Deriving wrapping key using deterministic SHA-256...")
-        
-        # Step 1: Combine ephemeral secret and recipient X25519 public key
-        combined_material = ephemeral_secret + self.recipient_x25519_pubkey
-        
-        # Step 2: First SHA-256 hash
-        first_hash = hashlib.sha256(combined_material).digest()
-        
-        # Step 3: Build KDF info string (same as mobile app)
-        info_string = f"{self.KDF_INFO.decode('utf-8')}:{self.recipient_pubkey[:8]}"
-        kdf_info = info_string.encode('utf-8')
-        
-        # Step 4: Second SHA-256 hash with KDF info
-        final_material = first_hash + kdf_info
-        wrapping_key = hashlib.sha256(final_material).digest()
-        
-        print(f"✓ Wrapping key derived: {len(wrapping_key)} bytes")
-        return wrapping_key
-    
-    def _decrypt_content_key(self, wrap: Dict[str, Any], wrapping_key: bytes) -> bytes:
-        """Decrypt wrapped content key using wrapping key."""
-        # Get wrapped content key and nonce
-        wrapped_ck = base64.b64decode(wrap['wrapped_ck'])
-        wrap_nonce = base64.b64decode(wrap['wrap_nonce'])
-        
-        print("🔓 Decrypting content key...")
-        
-        # Decrypt using AES-256-GCM
-        aesgcm = AESGCM(wrapping_key)
-        content_key = aesgcm.decrypt(wrap_nonce, wrapped_ck, None)
-        
-        print(f"✓ Content key decrypted: {len(content_key)} bytes")
-        return content_key
-    
-    def _decrypt_data(self, envelope: Dict[str, Any], content_key: bytes) -> bytes:
-        """Decrypt dataset using content key."""
-        # Get encrypted data, nonce, and tag
-        ciphertext = base64.b64decode(envelope['ciphertext'])
-        nonce = base64.b64decode(envelope['cipher_iv'])
-        tag = base64.b64decode(envelope['cipher_tag'])
-        
-        print("🔓 Decrypting dataset...")
-        print(f"   Ciphertext: {len(ciphertext)} bytes")
-        print(f"   Nonce: {len(nonce)} bytes")
-        print(f"   Auth tag: {len(tag)} bytes")
-        
-        # Combine ciphertext and tag (GCM expects them together)
-        ciphertext_with_tag = ciphertext + tag
-        
-        # Decrypt using AES-256-GCM
-        aesgcm = AESGCM(content_key)
-        decrypted_data = aesgcm.decrypt(nonce, ciphertext_with_tag, None)
-        
-        print(f"✓ Dataset decrypted: {len(decrypted_data)} bytes")
+        # Get encrypted data, nonce, and tag (already decoded by _parse_envelope)
+        ciphertext = envelope.ciphertext
+        nonce = envelope.iv
+        tag = envelope.tag
+        
+        self._log("🔓 Decrypting dataset...")
+        self._log(f"   Ciphertext: {len(ciphertext)} bytes")
+        self._log(f"   Nonce: {len(nonce)} bytes")
+        self._log(f"   Auth tag: {len(tag)} bytes")
+        
+        # Decrypt using AES-256-GCM in chunks, straight into a preallocated
+        # buffer. The tag is passed to the mode so ciphertext + tag is never
+        # materialized. update_into() needs block_size - 1 bytes of headroom.
+        decryptor = Cipher(algorithms.AES(content_key), modes.GCM(nonce, tag)).decryptor()
+        chunk_size = self.DECRYPT_CHUNK_SIZE
+        headroom = algorithms.AES.block_size // 8 - 1
+        ciphertext_view = memoryview(ciphertext)
+        
+        if writer is None:
+            output = bytearray(len(ciphertext) + headroom)
+        else:
+            output = bytearray(min(chunk_size, len(ciphertext)) + headroom)
+        output_view = memoryview(output)
+        
+        written = 0
+        for offset in range(0, len(ciphertext), chunk_size):
+            chunk = ciphertext_view[offset:offset + chunk_size]
+            if writer is None:
+                written += decryptor.update_into(chunk, output_view[written:])
+            else:
+                n = decryptor.update_into(chunk, output_view)
+                writer(bytes(output_view[:n]))
+                written += n
+        
+        # finalize() verifies the auth tag and raises InvalidTag on mismatch
+        decryptor.finalize()
+        output_view.release()
+        
+        if writer is not None:
+            self._log(f"✓ Dataset decrypted: {written} bytes")
+            return written
+        
+        # Trim the headroom and hand back the buffer itself (no final copy)
+        del output[written:]
+        decrypted_data = output
+        
+        self._log(f"✓ Dataset decrypted: {len(decrypted_data)} bytes")
         return decrypted_data
 
 
-def detect_format(data: bytes) -> str:
+def detect_format(data: Union[bytes, bytearray, memoryview]) -> str:
     """Auto-detect data format (CSV or JSON)."""
+    # Sniff only the head of the data instead of decoding all of it
+    head = bytes(data[:FORMAT_SNIFF_SIZE])
+    
     try:
-        # Try to decode as text
-        text = data.decode('utf-8', errors='strict')
-        
-        # Check for CSV indicators
-        if text.startswith('#') or ',' in text.split('\n')[0]:
-            return 'csv'
-        
-        # Check for JSON
-        text_stripped = text.strip()
-        if text_stripped.startswith('{') or text_stripped.startswith('['):
-            try:
-                json.loads(text_stripped)
-                return 'json'
-            except json.JSONDecodeError:
-                pass
-        
-        return 'csv'  # Default to CSV
-        
+        # Check the head is text. A multi-byte char may be cut off at the end
+        # of the head, but not at the end of the data itself.
+        codecs.getincrementaldecoder('utf-8')(errors='strict').decode(
+            head, final=len(data) <= FORMAT_SNIFF_SIZE
+        )
     except UnicodeDecodeError:
         return 'unknown'
+    
+    # Check for CSV indicators (comma on the first line, searched in place)
+    first_line_end = head.find(b'\n')
+    if first_line_end == -1:
+        first_line_end = len(head)
+    if head.startswith(b'#') or head.find(b',', 0, first_line_end) != -1:
+        return 'csv'
+    
+    # Check for JSON. Validated with stdlib json (not json_loads) so the
+    # result doesn't depend on orjson, which rejects e.g. NaN and 1e400.
+    if head.lstrip()[:1] in (b'{', b'['):
+        try:
+            json.loads(str(data, 'utf-8'))
+            return 'json'
+        except ValueError:
+            pass
+    
+    return 'csv'  # Default to CSV
+
+
+def map_file(path: str) -> memoryview:
+    """
+    Memory-map a file read-only.
+    
+    Pages are loaded on demand by the OS instead of being copied onto the
+    Python heap. The mapping is released once the returned view is dropped.
+    Pipes, devices and other non-regular files (which report size 0 or can't
+    be mapped) are read normally instead.
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        
+        # mmap refuses zero-length files; reading also covers regular files
+        # that report size 0 but have content (e.g. under /proc)
+        if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+            return memoryview(f.read())
+        
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def decrypt_to_file(
+    decryptor: DatasetDecryptor,
+    encrypted_data: Union[bytes, memoryview],
+    encrypted_aes_key_base64: Union[str, bytes, memoryview],
+    output_path: str,
+    detect: bool = False
+) -> Tuple[int, bytes, Optional[str]]:
+    """
+    Decrypt a dataset into output_path.
+    
+    Regular (or not yet existing) output files are streamed chunk by chunk
+    into a temp file next to them, which only replaces the output once the
+    auth tag has been verified. Anything else (pipes, /dev/stdout, ...) can't
+    be replaced, so the dataset is decrypted in memory and written once
+    verified.
+    
+    Args:
+        decryptor: Decryptor for the recipient
+        encrypted_data: Encrypted dataset bytes
+        encrypted_aes_key_base64: Base64-encoded encryption envelope
+        output_path: Path to write the decrypted dataset to
+        detect: Also auto-detect the data format
+        
+    Returns:
+        (decrypted size, first FORMAT_SNIFF_SIZE bytes, detected format or None)
+    """
+    try:
+        target_stat = os.stat(output_path)
+    except FileNotFoundError:
+        target_stat = None
+    
+    if target_stat is not None and not stat.S_ISREG(target_stat.st_mode):
+        decrypted_data = decryptor.decrypt_dataset(encrypted_data, encrypted_aes_key_base64)
+        with open(output_path, 'wb') as f:
+            f.write(decrypted_data)
+        output_format = detect_format(decrypted_data) if detect else None
+        return len(decrypted_data), bytes(decrypted_data[:FORMAT_SNIFF_SIZE]), output_format
+    
+    # Write through symlinks, as a plain open() would
+    target_path = os.path.realpath(output_path)
+    head = bytearray()
+    tmp = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(target_path),
+        prefix=f".{os.path.basename(target_path)}.",
+        suffix='.part',
+        delete=False,
+    )
+    
+    def write(chunk: bytes) -> None:
+        # Keep the head for format detection and preview
+        if len(head) < FORMAT_SNIFF_SIZE:
+            head.extend(chunk[:FORMAT_SNIFF_SIZE - len(head)])
+        tmp.write(chunk)
+    
+    try:
+        with tmp:
+            decrypted_size = decryptor.decrypt_dataset_to(encrypted_data, encrypted_aes_key_base64, write)
+        
+        # Temp files are created 0600; give the output the mode open() would
+        if target_stat is not None:
+            mode = stat.S_IMODE(target_stat.st_mode)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp.name, mode)
+        
+        output_format = None
+        if detect:
+            # Only a JSON-looking payload larger than the head needs the rest
+            if decrypted_size <= FORMAT_SNIFF_SIZE:
+                output_format = detect_format(head)
+            else:
+                output_format = detect_format(map_file(tmp.name))
+        
+        os.replace(tmp.name, target_path)
+    except BaseException:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+        raise
+    
+    return decrypted_size, bytes(head), output_format
 
 
 def main():
@@ -341,6 +756,9 @@ Examples:
     # Parse arguments
     args = parser.parse_args()
     
+    # Show decryptor progress alongside the CLI output
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    
     # Validate inputs
     if not args.encrypted_key and not args.encrypted_key_file:
         parser.error("Either --encrypted-key or --encrypted-key-file is required")
@@ -351,15 +769,14 @@ Examples:
     try:
         # Read encrypted data
         print(f"📁 Reading encrypted file: {args.encrypted_file}")
-        with open(args.encrypted_file, 'rb') as f:
-            encrypted_data = f.read()
+        encrypted_data = map_file(args.encrypted_file)
         print(f"   Loaded {len(encrypted_data)} bytes")
         
         # Read encrypted key
         if args.encrypted_key_file:
             print(f"📁 Reading encrypted key from: {args.encrypted_key_file}")
-            with open(args.encrypted_key_file, 'r') as f:
-                encrypted_aes_key = f.read().strip()
+            # Surrounding whitespace is skipped by the base64 decoder
+            encrypted_aes_key = map_file(args.encrypted_key_file)
         else:
             encrypted_aes_key = args.encrypted_key
         
@@ -379,31 +796,33 @@ Examples:
         decryptor = DatasetDecryptor(args.recipient_pubkey, recipient_private_key)
         
         # Decrypt dataset
+        print(f"💾 Writing decrypted data to: {args.output}")
         print("\n" + "="*80)
-        decrypted_data = decryptor.decrypt_dataset(encrypted_data, encrypted_aes_key)
+        decrypted_size, head, detected_format = decrypt_to_file(
+            decryptor,
+            encrypted_data,
+            encrypted_aes_key,
+            args.output,
+            detect=args.format == 'auto',
+        )
         print("="*80 + "\n")
         
         # Auto-detect format if needed
         output_format = args.format
         if output_format == 'auto':
-            output_format = detect_format(decrypted_data)
+            output_format = detected_format
             print(f"📊 Auto-detected format: {output_format}")
         
-        # Write output
-        print(f"💾 Writing decrypted data to: {args.output}")
-        with open(args.output, 'wb') as f:
-            f.write(decrypted_data)
-        
         # Show preview
-        preview = decrypted_data[:500].decode('utf-8', errors='replace')
+        preview = head[:500].decode('utf-8', errors='replace')
         print("\n📄 Preview (first 500 chars):")
         print("-" * 80)
         print(preview)
-        if len(decrypted_data) > 500:
-            print(f"... ({len(decrypted_data) - 500} more bytes)")
+        if decrypted_size > 500:
+            print(f"... ({decrypted_size - 500} more bytes)")
         print("-" * 80)
         
-        print(f"\n✅ SUCCESS! Decrypted {len(decrypted_data)} bytes to {args.output}")
+        print(f"\n✅ SUCCESS! Decrypted {decrypted_size} bytes to {args.output}")
         print(f"   Format: {output_format}")
         
     except FileNotFoundError as e: